@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import threading
+
+# The connection is shared by the worker threads the bot offloads writes to,
+# so every statement runs under this lock.
+_lock = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_wallets (
+    user_id INTEGER PRIMARY KEY,
+    secret  BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_pairs (
+    user_id INTEGER PRIMARY KEY,
+    pair    TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS price_alerts (
+    user_id   INTEGER PRIMARY KEY,
+    threshold REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS positions (
+    signature      TEXT PRIMARY KEY,
+    user_id        INTEGER NOT NULL,
+    pair           TEXT NOT NULL,
+    amount         REAL NOT NULL,
+    purchase_price REAL,
+    timestamp      REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS positions_user_pair ON positions (user_id, pair);
+"""
+
+# ---------------------------- CONNECTION ----------------------------
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Opens the bot database in WAL mode and creates the tables if needed.
+    The files hold wallet secrets, so they are readable by the owner only.
+    """
+    # Create the file as 0600 before SQLite opens it; SQLite gives the -wal
+    # and -shm files it creates the same mode as the main database file.
+    os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+    # Tighten files left by earlier runs, which may have been created 0644
+    for file_path in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(file_path):
+            os.chmod(file_path, 0o600)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def load_state(conn: sqlite3.Connection) -> dict:
+    """
+    Reads every table into plain Python structures for the bot's in-memory dicts.
+    """
+    with _lock:
+        return {
+            "user_wallets": dict(conn.execute("SELECT user_id, secret FROM user_wallets")),
+            "user_pairs": dict(conn.execute("SELECT user_id, pair FROM user_pairs")),
+            "price_alerts": dict(conn.execute("SELECT user_id, threshold FROM price_alerts")),
+            "positions": [
+                {"user_id": row[0], "pair": row[1], "amount": row[2],
+                 "purchase_price": row[3], "timestamp": row[4], "signature": row[5]}
+                for row in conn.execute(
+                    "SELECT user_id, pair, amount, purchase_price, timestamp, signature "
+                    "FROM positions ORDER BY timestamp"
+                )
+            ],
+        }
+
+# ---------------------------- WRITES ----------------------------
+def _write(conn: sqlite3.Connection, sql: str, params: tuple):
+    with _lock, conn:
+        conn.execute(sql, params)
+
+def save_wallet(conn: sqlite3.Connection, user_id: int, secret: bytes):
+    _write(conn, "INSERT OR REPLACE INTO user_wallets (user_id, secret) VALUES (?, ?)", (user_id, secret))
+
+def save_pair(conn: sqlite3.Connection, user_id: int, pair: str):
+    _write(conn, "INSERT OR REPLACE INTO user_pairs (user_id, pair) VALUES (?, ?)", (user_id, pair))
+
+def save_alert(conn: sqlite3.Connection, user_id: int, threshold: float):
+    _write(conn, "INSERT OR REPLACE INTO price_alerts (user_id, threshold) VALUES (?, ?)", (user_id, threshold))
+
+def delete_alert(conn: sqlite3.Connection, user_id: int):
+    _write(conn, "DELETE FROM price_alerts WHERE user_id = ?", (user_id,))
+
+def add_position(conn: sqlite3.Connection, user_id: int, pos: dict):
+    _write(
+        conn,
+        "INSERT OR REPLACE INTO positions (signature, user_id, pair, amount, purchase_price, timestamp) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (str(pos["signature"]), user_id, pos["pair"], pos["amount"], pos["purchase_price"], pos["timestamp"]),
+    )
+
+def delete_positions(conn: sqlite3.Connection, signatures: list):
+    with _lock, conn:
+        conn.executemany("DELETE FROM positions WHERE signature = ?", [(sig,) for sig in signatures])
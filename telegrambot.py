@@ -3,12 +3,14 @@
 
 import os
 import json
-import requests
-import base58
 import asyncio
+import functools
 import time
 import logging
 
+import aiohttp
+import orjson
+import db
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     ApplicationBuilder,
@@ -21,7 +23,8 @@ from telegram.ext import (
 )
 from solders.keypair import Keypair
 from solders.message import Message
-from solana.rpc.api import Client
+from solders.instruction import Instruction
+from solana.rpc.async_api import AsyncClient
 from solana.rpc.core import RPCException
 from solana.rpc.types import TxOpts
 from solders.transaction import Transaction
@@ -50,30 +53,102 @@ async def safe_reply_text(update: Update, text: str, reply_markup=None):
 TELEGRAM_BOT_TOKEN = "YOUR_TELEGRAM_BOT_TOKEN_HERE"  # Replace with your API token from BotFather
 SOLANA_RPC_URL = "https://rpc.free.gsnode.io/"  # Your RPC URL (or private RPC)
 CHAIN_ID = "solana"
-
-# Global dictionaries
+WEBHOOK_URL = ""  # Public HTTPS base URL (e.g. "https://bot.example.com"); leave empty to use polling
+WEBHOOK_PORT = 8443
+DB_PATH = "bot.db"  # SQLite file holding wallets, pairs, alerts and positions across restarts
+PRICE_TTL = 15  # Seconds a DexScreener lookup is reused before refetching
+BLOCKHASH_TTL = 15  # Seconds a blockhash is reused (it stays valid for ~60s)
+RPC_MAX_CONCURRENCY = 8  # Max in-flight Solana RPC requests, to stay under per-IP rate limits
+
+# Global dictionaries (in-memory copies of the tables in DB_PATH)
 user_pairs = {}      # user_id -> pair address
 price_alerts = {}    # user_id -> price threshold
-user_wallets = {}    # user_id -> Keypair (each user must connect their wallet)
-positions = {}       # user_id -> list of positions (each with the associated pair)
+user_wallets = {}    # user_id -> wallet dict from make_wallet (each user must connect their wallet)
+positions = {}       # user_id -> {pair address -> list of positions}
+_price_cache = {}    # (chain_id, pair_id) -> (monotonic timestamp, info dict)
+_price_inflight = {} # (chain_id, pair_id) -> asyncio.Future of an ongoing fetch
+_blockhash_cache = {"hash": None, "ts": 0.0}
+_blockhash_lock = asyncio.Lock()
+rpc_semaphore = asyncio.Semaphore(RPC_MAX_CONCURRENCY)  # Bounds every solana_client call
 
 # Dummy DEX wallet (to simulate buy/sell transactions)
 DEX_WALLET_STR = "5h2rm7GxxAbEP8cHKY1eLZ54Wb8SLF7u2SmbK7gG3J4W"  # Replace with a valid address if needed
-DEX_WALLET = PublicKey(base58.b58decode(DEX_WALLET_STR))
+DEX_WALLET = PublicKey.from_string(DEX_WALLET_STR)
+MEMO_PROGRAM_ID = PublicKey.from_string("MemoSq4gqABAXKb96qnH8TysNcWxMyWCqXgDLGmfcHr")
 
 # ---------------------------- 2. INITIALIZE CLIENTS ----------------------------
 def create_solana_keypair(base58_key: str) -> Keypair:
-    raw_key = base58.b58decode(base58_key)
-    return Keypair.from_bytes(raw_key)
+    # solders decodes base58 natively, far faster than the pure-Python base58 package
+    return Keypair.from_base58_string(base58_key)
+
+def make_wallet(kp: Keypair) -> dict:
+    """
+    Bundles a connected keypair with its public key, pre-encoded once so
+    message rendering does not re-run base58 encoding.
+    """
+    pubkey = kp.pubkey()
+    return {"kp": kp, "pubkey": pubkey, "pubkey_str": str(pubkey)}
+
+def format_position_time(timestamp: float) -> str:
+    return time.strftime("🕒 %Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+async def persist(bot_data: dict, write, *args, required: bool = False) -> bool:
+    """
+    Runs a db write on a worker thread so SQLite I/O never blocks the event loop.
+    Returns False if the write failed, or re-raises when required is set.
+    """
+    try:
+        await asyncio.to_thread(write, bot_data["db"], *args)
+        return True
+    except Exception as e:
+        logging.error(f"[Error] persist {write.__name__}: {e}")
+        if required:
+            raise
+        return False
 
-solana_client = Client(SOLANA_RPC_URL)
+solana_client = AsyncClient(SOLANA_RPC_URL)
 
 # ---------------------------- 3. DEX SCREENER INFO ----------------------------
-def get_dexscreener_info(chain_id: str, pair_id: str) -> dict:
+async def get_dexscreener_info(session: aiohttp.ClientSession, chain_id: str, pair_id: str) -> dict:
+    """
+    Returns cached price info for the pair when it is fresher than PRICE_TTL.
+    Concurrent misses for the same pair share a single upstream request.
+    """
+    key = (chain_id, pair_id)
+    cached = _price_cache.get(key)
+    if cached:
+        if time.monotonic() - cached[0] < PRICE_TTL:
+            return cached[1]
+        del _price_cache[key]
+    if key in _price_inflight:
+        return await asyncio.shield(_price_inflight[key])
+    future = asyncio.get_running_loop().create_future()
+    _price_inflight[key] = future
+    try:
+        info = await _fetch_dexscreener_info(session, chain_id, pair_id)
+        if info:
+            _price_cache[key] = (time.monotonic(), info)
+        future.set_result(info)
+        return info
+    finally:
+        if not future.done():
+            future.set_result({})
+        del _price_inflight[key]
+
+def prune_price_cache():
+    """
+    Drops expired entries, including pairs nobody looks up any more.
+    """
+    now = time.monotonic()
+    for key, (ts, _) in list(_price_cache.items()):
+        if now - ts >= PRICE_TTL:
+            del _price_cache[key]
+
+async def _fetch_dexscreener_info(session: aiohttp.ClientSession, chain_id: str, pair_id: str) -> dict:
     url = f"https://api.dexscreener.com/latest/dex/pairs/{chain_id}/{pair_id}"
     try:
-        resp = requests.get(url, timeout=10)
-        data = resp.json()
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
+            data = orjson.loads(await resp.read())
         if "pairs" in data and len(data["pairs"]) > 0:
             pair_info = data["pairs"][0]
             price_usd = pair_info.get("priceUsd")
@@ -82,90 +157,134 @@ def get_dexscreener_info(chain_id: str, pair_id: str) -> dict:
         else:
             return {}
     except Exception as e:
-        logging.error(f"[Error] get_dexscreener_info: {e}")
+        logging.error(f"[Error] _fetch_dexscreener_info: {e}")
         return {}
 
 # ---------------------------- 4. BLOCKCHAIN TRANSACTION FUNCTIONS ----------------------------
-def execute_buy_transaction(amount: float, user_kp: Keypair) -> dict:
+async def get_recent_blockhash():
+    """
+    Returns (blockhash, from_cache). A blockhash is reused for BLOCKHASH_TTL
+    seconds, so bursts of trades share one get_latest_blockhash round-trip.
+    """
+    if _blockhash_cache["hash"] and time.monotonic() - _blockhash_cache["ts"] < BLOCKHASH_TTL:
+        return _blockhash_cache["hash"], True
+    async with _blockhash_lock:
+        # Another trade may have refreshed it while we waited for the lock
+        if _blockhash_cache["hash"] and time.monotonic() - _blockhash_cache["ts"] < BLOCKHASH_TTL:
+            return _blockhash_cache["hash"], True
+        async with rpc_semaphore:
+            resp = await solana_client.get_latest_blockhash()
+        _blockhash_cache["hash"] = resp.value.blockhash
+        _blockhash_cache["ts"] = time.monotonic()
+        return _blockhash_cache["hash"], False
+
+async def _send_signed(instructions: list, user_kp: Keypair, recent_blockhash, preflight: bool):
+    msg = Message(instructions=instructions, payer=user_kp.pubkey())
+    tx = Transaction(message=msg, recent_blockhash=recent_blockhash, from_keypairs=[user_kp])
+    async with rpc_semaphore:
+        result = await solana_client.send_transaction(tx, opts=TxOpts(skip_preflight=not preflight))
+    return result.value  # Access signature via result.value
+
+async def _execute_transfer(amount: float, user_kp: Keypair, label: str, noun: str) -> dict:
+    """
+    Sends the simulated trade transfer to DEX_WALLET. label names the caller
+    in logs ("buy"/"sell"); noun is used in user-facing errors.
+    """
+    payer = user_kp.pubkey()
     instruction = transfer(
         TransferParams(
-            from_pubkey=user_kp.pubkey(),
+            from_pubkey=payer,
             to_pubkey=DEX_WALLET,
             lamports=int(amount * 1e9)
         )
     )
+    # Signing is deterministic and the blockhash is shared between trades, so a
+    # random memo keeps two identical trades from producing the same transaction
+    nonce = Instruction(MEMO_PROGRAM_ID, os.urandom(8).hex().encode(), [])
+    instructions = [instruction, nonce]
     try:
-        resp = solana_client.get_latest_blockhash()
-        recent_blockhash = resp.value.blockhash
-        msg = Message(instructions=[instruction], payer=user_kp.pubkey())
-        tx = Transaction(message=msg, recent_blockhash=recent_blockhash, from_keypairs=[user_kp])
-        result = solana_client.send_transaction(tx, opts=TxOpts(skip_preflight=True))
-        signature = result.value  # Access signature via result.value
-        logging.info(f"[Info] execute_buy_transaction: signature={signature}")
-        return {"status": "ok", "signature": signature, "error": None}
-    except Exception as e:
-        err_str = str(e).lower()
-        if "insufficient funds" in err_str:
-            user_friendly = "💸 Insufficient funds for purchase."
+        recent_blockhash, from_cache = await get_recent_blockhash()
+        if not from_cache:
+            signature = await _send_signed(instructions, user_kp, recent_blockhash, preflight=False)
         else:
-            user_friendly = f"❌ Error during purchase: {e}"
-        logging.error(f"[Error] execute_buy_transaction: {e}")
-        return {"status": "error", "signature": None, "error": user_friendly}
-
-def execute_sell_transaction(amount: float, user_kp: Keypair) -> dict:
-    instruction = transfer(
-        TransferParams(
-            from_pubkey=user_kp.pubkey(),
-            to_pubkey=DEX_WALLET,
-            lamports=int(amount * 1e9)
-        )
-    )
-    try:
-        resp = solana_client.get_latest_blockhash()
-        recent_blockhash = resp.value.blockhash
-        msg = Message(instructions=[instruction], payer=user_kp.pubkey())
-        tx = Transaction(message=msg, recent_blockhash=recent_blockhash, from_keypairs=[user_kp])
-        result = solana_client.send_transaction(tx, opts=TxOpts(skip_preflight=True))
-        signature = result.value
-        logging.info(f"[Info] execute_sell_transaction: signature={signature}")
+            # Only preflight reports an expired blockhash; without it a stale
+            # cached hash would be dropped silently after the send "succeeded"
+            try:
+                signature = await _send_signed(instructions, user_kp, recent_blockhash, preflight=True)
+            except RPCException:
+                # Preflight rejected it before broadcast, so retrying with a
+                # fresh blockhash cannot transfer twice
+                _blockhash_cache["hash"] = None
+                recent_blockhash, _ = await get_recent_blockhash()
+                signature = await _send_signed(instructions, user_kp, recent_blockhash, preflight=True)
+        logging.info(f"[Info] execute_{label}_transaction: signature={signature}")
         return {"status": "ok", "signature": signature, "error": None}
     except Exception as e:
         err_str = str(e).lower()
         if "insufficient funds" in err_str:
-            user_friendly = "💸 Insufficient funds for sale."
+            user_friendly = f"💸 Insufficient funds for {noun}."
         else:
-            user_friendly = f"❌ Error during sale: {e}"
-        logging.error(f"[Error] execute_sell_transaction: {e}")
+            user_friendly = f"❌ Error during {noun}: {e}"
+        logging.error(f"[Error] execute_{label}_transaction: {e}")
         return {"status": "error", "signature": None, "error": user_friendly}
 
+async def execute_buy_transaction(amount: float, user_kp: Keypair) -> dict:
+    return await _execute_transfer(amount, user_kp, "buy", "purchase")
+
+async def execute_sell_transaction(amount: float, user_kp: Keypair) -> dict:
+    return await _execute_transfer(amount, user_kp, "sell", "sale")
+
 # ---------------------------- 5. UTILITY FUNCTIONS ----------------------------
-def get_balance_solana(pubkey: PublicKey) -> float:
+async def get_balance_solana(pubkey: PublicKey) -> float:
     try:
-        balance_lamports = solana_client.get_balance(pubkey)["result"]["value"]
-        return balance_lamports / 1e9
-    except (RPCException, KeyError):
+        async with rpc_semaphore:
+            resp = await solana_client.get_balance(pubkey)
+        return resp.value / 1e9
+    except RPCException:
         return 0.0
 
 # ---------------------------- 6. MAIN MENU WITH BUTTONS ----------------------------
+# Inline keyboards never change, so they are built once at import time
+MAIN_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("🔗 Connect Wallet", callback_data="menu_connectwallet"),
+     InlineKeyboardButton("🔧 Set Pair", callback_data="menu_setpair")],
+    [InlineKeyboardButton("💵 Buy", callback_data="menu_buy"),
+     InlineKeyboardButton("📉 Sell", callback_data="menu_sell")],
+    [InlineKeyboardButton("💰 Balance", callback_data="menu_balance"),
+     InlineKeyboardButton("📊 Positions", callback_data="menu_positions")],
+    [InlineKeyboardButton("🚨 Alert", callback_data="menu_alert")],
+])
+
+BUY_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("💵 0.1 SOL", callback_data="buy_0.1"),
+     InlineKeyboardButton("💵 0.3 SOL", callback_data="buy_0.3")],
+    [InlineKeyboardButton("💵 0.5 SOL", callback_data="buy_0.5"),
+     InlineKeyboardButton("💵 1 SOL", callback_data="buy_1")],
+    [InlineKeyboardButton("✏️ Custom", callback_data="buy_custom")]
+])
+
+SELL_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("📉 10 tokens", callback_data="sell_10"),
+     InlineKeyboardButton("📉 50 tokens", callback_data="sell_50")],
+    [InlineKeyboardButton("📉 100 tokens", callback_data="sell_100"),
+     InlineKeyboardButton("📉 500 tokens", callback_data="sell_500")],
+    [InlineKeyboardButton("🚀 Sell All", callback_data="sell_all"),
+     InlineKeyboardButton("✏️ Custom", callback_data="sell_custom")]
+])
+
+# Fixed-amount button callback_data -> amount, so presses need no parsing
+BUY_AMOUNTS = {"buy_0.1": 0.1, "buy_0.3": 0.3, "buy_0.5": 0.5, "buy_1": 1.0}
+SELL_AMOUNTS = {"sell_10": 10.0, "sell_50": 50.0, "sell_100": 100.0, "sell_500": 500.0}
+
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     if user_id in user_wallets:
-        wallet_status = f"🟢 {str(user_wallets[user_id].pubkey())[:7]}"
+        wallet_status = f"🟢 {user_wallets[user_id]['pubkey_str'][:7]}"
     else:
         wallet_status = "🔴 (Wallet not connected)"
-    keyboard = [
-        [InlineKeyboardButton("🔗 Connect Wallet", callback_data="menu_connectwallet"),
-         InlineKeyboardButton("🔧 Set Pair", callback_data="menu_setpair")],
-        [InlineKeyboardButton("💵 Buy", callback_data="menu_buy"),
-         InlineKeyboardButton("📉 Sell", callback_data="menu_sell")],
-        [InlineKeyboardButton("💰 Balance", callback_data="menu_balance"),
-         InlineKeyboardButton("📊 Positions", callback_data="menu_positions")],
-        [InlineKeyboardButton("🚨 Alert", callback_data="menu_alert")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await safe_reply_text(update, 
         f"*Hello! I'm your Solana Trading Bot.*\n\nWallet: {wallet_status}\n\n_Select an option:_",
-        reply_markup=reply_markup
+        reply_markup=MAIN_MARKUP
     )
 
 # ---------------------------- 7. MAIN MENU HANDLER ----------------------------
@@ -199,10 +318,12 @@ async def connectwallet_command(update: Update, context: ContextTypes.DEFAULT_TY
         return
     pk_base58 = context.args[0]
     try:
-        new_kp = Keypair.from_bytes(base58.b58decode(pk_base58))
-        user_wallets[update.effective_user.id] = new_kp
-        pubkey_str = str(new_kp.pubkey())
-        await safe_reply_text(update, f"✅ Wallet connected!\nWallet: 🟢 {pubkey_str[:7]}...")
+        new_kp = create_solana_keypair(pk_base58)
+        wallet = make_wallet(new_kp)
+        # Save first: a wallet that is not on disk would vanish on restart
+        await persist(context.bot_data, db.save_wallet, update.effective_user.id, bytes(new_kp), required=True)
+        user_wallets[update.effective_user.id] = wallet
+        await safe_reply_text(update, f"✅ Wallet connected!\nWallet: 🟢 {wallet['pubkey_str'][:7]}...")
     except Exception as e:
         await safe_reply_text(update, f"❌ Error connecting wallet: {e}")
     await start_command(update, context)
@@ -213,6 +334,7 @@ async def setpair_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     pair_id = context.args[0]
     user_pairs[update.effective_user.id] = pair_id
+    await persist(context.bot_data, db.save_pair, update.effective_user.id, pair_id)
     await safe_reply_text(update, f"✅ Pair set to: `{pair_id}`\n")
     await start_command(update, context)
 
@@ -222,7 +344,7 @@ async def price_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await safe_reply_text(update, "You haven't set a pair yet. Use /setpair first.")
         return
     pair_id = user_pairs[user_id]
-    info = get_dexscreener_info(CHAIN_ID, pair_id)
+    info = await get_dexscreener_info(context.bot_data["http"], CHAIN_ID, pair_id)
     if info and info.get("price") is not None:
         text = f"*Current price for {pair_id}:*\n💲 `{info['price']:.6f} USD`"
         await safe_reply_text(update, text)
@@ -242,36 +364,37 @@ async def balance_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user_id not in user_wallets:
         await safe_reply_text(update, "You don't have a connected wallet. Use /connectwallet")
         return
-    kp = user_wallets[user_id]
-    bal = get_balance_solana(kp.pubkey())
-    await safe_reply_text(update, f"*Your Wallet Balance:*\n💰 `{kp.pubkey()}`:\n`{bal} SOL`")
+    wallet = user_wallets[user_id]
+    bal = await get_balance_solana(wallet["pubkey"])
+    await safe_reply_text(update, f"*Your Wallet Balance:*\n💰 `{wallet['pubkey_str']}`:\n`{bal} SOL`")
 
 async def positions_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    if user_id not in positions or not positions[user_id]:
+    if not any(positions.get(user_id, {}).values()):
         await safe_reply_text(update, "You have no open positions.")
         return
     if user_id not in user_pairs:
         await safe_reply_text(update, "No pair set for PnL calculation.")
         return
     current_pair = user_pairs[user_id]
-    filtered_positions = [pos for pos in positions[user_id] if pos.get("pair", current_pair) == current_pair]
+    filtered_positions = positions[user_id].get(current_pair, [])
     if not filtered_positions:
         await safe_reply_text(update, "No open positions for the current pair.")
         return
-    current_price = get_dexscreener_info(CHAIN_ID, current_pair).get("price")
-    msg = f"*📊 Positions for {current_pair}:*\n\n"
+    current_price = (await get_dexscreener_info(context.bot_data["http"], CHAIN_ID, current_pair)).get("price")
+    parts = [f"*📊 Positions for {current_pair}:*\n"]
     total_pnl = 0.0
     for pos in filtered_positions:
-        pnl = (current_price - pos["purchase_price"]) * pos["amount"]
+        amount = pos["amount"]
+        purchase_price = pos["purchase_price"]
+        pnl = (current_price - purchase_price) * amount
         total_pnl += pnl
-        purchase_time = time.strftime("🕒 %Y-%m-%d %H:%M:%S", time.localtime(pos["timestamp"]))
-        msg += (f"• *Purchase:* `{pos['amount']} SOL` at 💲`{pos['purchase_price']:.6f} USD`\n"
-                f"  {purchase_time}\n"
-                f"  *Signature:* `{pos['signature']}`\n"
-                f"  *PnL:* `{pnl:.2f} USD`\n\n")
-    msg += f"👉 *Total PnL:* `{total_pnl:.2f} USD`"
-    await safe_reply_text(update, msg)
+        parts.append(f"• *Purchase:* `{amount} SOL` at 💲`{purchase_price:.6f} USD`\n"
+                     f"  {pos['time_str']}\n"
+                     f"  *Signature:* `{pos['signature']}`\n"
+                     f"  *PnL:* `{pnl:.2f} USD`\n")
+    parts.append(f"👉 *Total PnL:* `{total_pnl:.2f} USD`")
+    await safe_reply_text(update, "\n".join(parts))
 
 async def alert_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if len(context.args) < 1:
@@ -281,6 +404,7 @@ async def alert_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         threshold = float(context.args[0])
         user_id = update.effective_user.id
         price_alerts[user_id] = threshold
+        await persist(context.bot_data, db.save_alert, user_id, threshold)
         await safe_reply_text(update, f"🚨 Alert set: I'll notify you when the price exceeds 💲{threshold} USD.")
     except ValueError:
         await safe_reply_text(update, "Invalid price. Please try /alert again.")
@@ -291,31 +415,75 @@ async def buy_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if user_id not in user_wallets:
         await safe_reply_text(update, "You must connect your wallet with /connectwallet before buying.")
         return
-    keyboard = [
-        [InlineKeyboardButton("💵 0.1 SOL", callback_data="buy_0.1"),
-         InlineKeyboardButton("💵 0.3 SOL", callback_data="buy_0.3")],
-        [InlineKeyboardButton("💵 0.5 SOL", callback_data="buy_0.5"),
-         InlineKeyboardButton("💵 1 SOL", callback_data="buy_1")],
-        [InlineKeyboardButton("✏️ Custom", callback_data="buy_custom")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await safe_reply_text(update, "Select an amount to buy:", reply_markup=reply_markup)
+    await safe_reply_text(update, "Select an amount to buy:", reply_markup=BUY_MARKUP)
 
 async def sell_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     if user_id not in user_wallets:
         await safe_reply_text(update, "You must connect your wallet with /connectwallet before selling.")
         return
-    keyboard = [
-        [InlineKeyboardButton("📉 10 tokens", callback_data="sell_10"),
-         InlineKeyboardButton("📉 50 tokens", callback_data="sell_50")],
-        [InlineKeyboardButton("📉 100 tokens", callback_data="sell_100"),
-         InlineKeyboardButton("📉 500 tokens", callback_data="sell_500")],
-        [InlineKeyboardButton("🚀 Sell All", callback_data="sell_all"),
-         InlineKeyboardButton("✏️ Custom", callback_data="sell_custom")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await safe_reply_text(update, "Select an amount to sell:", reply_markup=reply_markup)
+    await safe_reply_text(update, "Select an amount to sell:", reply_markup=SELL_MARKUP)
+
+async def _finalize_buy(context: ContextTypes.DEFAULT_TYPE, message, user_id: int, wallet: dict, amount: float):
+    """
+    Runs a buy in the background and reports the result as a follow-up message.
+    """
+    pair_id = user_pairs.get(user_id, "")
+    current_price = (await get_dexscreener_info(context.bot_data["http"], CHAIN_ID, pair_id)).get("price", 0.0) if pair_id else 0.0
+    result_dict = await execute_buy_transaction(amount, wallet["kp"])
+    if result_dict["status"] == "error":
+        await message.reply_text(f"❌ {result_dict['error']}")
+        return
+    timestamp = time.time()
+    pos = {
+        "amount": amount,
+        "purchase_price": current_price,
+        "signature": result_dict["signature"],
+        "timestamp": timestamp,
+        "time_str": format_position_time(timestamp),
+        "pair": pair_id
+    }
+    positions.setdefault(user_id, {}).setdefault(pair_id, []).append(pos)
+    # The transfer already happened, so keep the position even if saving fails
+    saved = await persist(context.bot_data, db.add_position, user_id, pos)
+    text = f"✅ Purchase executed:\nAmount: {amount} SOL\nSignature: `{result_dict['signature']}`\nWallet: `{wallet['pubkey_str']}`"
+    if not saved:
+        text += "\n⚠️ This position could not be saved and will be lost if the bot restarts."
+    await message.reply_text(text)
+
+async def _finalize_sell(message, wallet: dict, amount: float):
+    """
+    Runs a sale in the background and reports the result as a follow-up message.
+    """
+    result_dict = await execute_sell_transaction(amount, wallet["kp"])
+    if result_dict["status"] == "error":
+        await message.reply_text(f"❌ {result_dict['error']}")
+        return
+    await message.reply_text(
+        f"✅ Sale executed:\nAmount: {amount} tokens\nSignature: `{result_dict['signature']}`\nWallet: `{wallet['pubkey_str']}`"
+    )
+
+async def _finalize_sell_all(context: ContextTypes.DEFAULT_TYPE, message, user_id: int, wallet: dict, pair_id: str):
+    """
+    Sells all positions of a pair, putting them back if the sale fails.
+    """
+    total_amount = sum(pos["amount"] for pos in positions.get(user_id, {}).get(pair_id, []))
+    if total_amount == 0:
+        # An earlier Sell All press already took them
+        await message.reply_text("You have no tokens to sell for the current pair.")
+        return
+    # Detach the bucket before awaiting so a second Sell All cannot sell it twice
+    sold = positions[user_id].pop(pair_id)
+    result_dict = await execute_sell_transaction(total_amount, wallet["kp"])
+    if result_dict["status"] == "error":
+        positions.setdefault(user_id, {}).setdefault(pair_id, [])[:0] = sold
+        await message.reply_text(f"❌ {result_dict['error']}")
+        return
+    # Only the sold positions: buys made while the sale was in flight must survive
+    await persist(context.bot_data, db.delete_positions, [str(pos["signature"]) for pos in sold])
+    await message.reply_text(
+        f"🚀 Sell All executed:\nAmount: {total_amount} tokens\nSignature: `{result_dict['signature']}`\nWallet: `{wallet['pubkey_str']}`"
+    )
 
 async def handle_buy_sell_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -327,60 +495,34 @@ async def handle_buy_sell_callback(update: Update, context: ContextTypes.DEFAULT
         await query.message.reply_text("You must connect your wallet with /connectwallet before operating.")
         return
 
-    user_kp = user_wallets[user_id]
+    wallet = user_wallets[user_id]
 
-    if data.startswith("buy_"):
-        if data == "buy_custom":
-            await query.message.reply_text("Enter the amount of SOL to buy (e.g., 0.25):")
-            context.user_data["awaiting_buy_custom"] = True
-            return
-        else:
-            amount = float(data.split("_")[1])
-            current_price = get_dexscreener_info(CHAIN_ID, user_pairs.get(user_id, "")).get("price", 0.0) if user_id in user_pairs else 0.0
-            result_dict = execute_buy_transaction(amount, user_kp)
-            if result_dict["status"] == "error":
-                await query.message.reply_text(f"❌ {result_dict['error']}")
-                return
-            pos = {
-                "amount": amount,
-                "purchase_price": current_price,
-                "signature": result_dict["signature"],
-                "timestamp": time.time(),
-                "pair": user_pairs.get(user_id, "")
-            }
-            positions.setdefault(user_id, []).append(pos)
-            await query.message.reply_text(
-                f"✅ Purchase executed:\nAmount: {amount} SOL\nSignature: `{result_dict['signature']}`\nWallet: `{user_kp.pubkey()}`"
-            )
-
-    elif data.startswith("sell_"):
-        if data == "sell_custom":
-            await query.message.reply_text("Enter the number of tokens to sell (e.g., 25):")
-            context.user_data["awaiting_sell_custom"] = True
+    if data in BUY_AMOUNTS:
+        trade = functools.partial(_finalize_buy, context, query.message, user_id, wallet, BUY_AMOUNTS[data])
+    elif data in SELL_AMOUNTS:
+        trade = functools.partial(_finalize_sell, query.message, wallet, SELL_AMOUNTS[data])
+    elif data == "sell_all":
+        current_pair = user_pairs.get(user_id, "")
+        if sum(pos["amount"] for pos in positions.get(user_id, {}).get(current_pair, [])) == 0:
+            await query.message.reply_text("You have no tokens to sell for the current pair.")
             return
-        elif data == "sell_all":
-            current_pair = user_pairs.get(user_id, "")
-            total_amount = sum(pos["amount"] for pos in positions.get(user_id, []) if pos.get("pair", current_pair) == current_pair)
-            if total_amount == 0:
-                await query.message.reply_text("You have no tokens to sell for the current pair.")
-                return
-            result_dict = execute_sell_transaction(total_amount, user_kp)
-            if result_dict["status"] == "error":
-                await query.message.reply_text(f"❌ {result_dict['error']}")
-                return
-            positions[user_id] = [pos for pos in positions.get(user_id, []) if pos.get("pair", current_pair) != current_pair]
-            await query.message.reply_text(
-                f"🚀 Sell All executed:\nAmount: {total_amount} tokens\nSignature: `{result_dict['signature']}`\nWallet: `{user_kp.pubkey()}`"
-            )
-        else:
-            amount = float(data.split("_")[1])
-            result_dict = execute_sell_transaction(amount, user_kp)
-            if result_dict["status"] == "error":
-                await query.message.reply_text(f"❌ {result_dict['error']}")
-                return
-            await query.message.reply_text(
-                f"✅ Sale executed:\nAmount: {amount} tokens\nSignature: `{result_dict['signature']}`\nWallet: `{user_kp.pubkey()}`"
-            )
+        trade = functools.partial(_finalize_sell_all, context, query.message, user_id, wallet, current_pair)
+    elif data == "buy_custom":
+        await query.message.reply_text("Enter the amount of SOL to buy (e.g., 0.25):")
+        context.user_data["awaiting_buy_custom"] = True
+        return
+    elif data == "sell_custom":
+        await query.message.reply_text("Enter the number of tokens to sell (e.g., 25):")
+        context.user_data["awaiting_sell_custom"] = True
+        return
+    else:
+        return
+
+    # Reply right away and let the blockchain work finish in the background
+    await query.message.reply_text("⏳ Submitting transaction…")
+    # The coroutine is only created once the reply went out, so a failed
+    # reply never leaves an unawaited trade behind
+    context.application.create_task(trade(), update=update)
 
 async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_text = update.message.text.strip()
@@ -389,10 +531,12 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.user_data.get("awaiting_connectwallet"):
         context.user_data["awaiting_connectwallet"] = False
         try:
-            new_kp = Keypair.from_bytes(base58.b58decode(user_text))
-            user_wallets[user_id] = new_kp
-            pubkey_str = str(new_kp.pubkey())
-            await update.message.reply_text(f"✅ Wallet connected!\nWallet: 🟢 {pubkey_str[:7]}...")
+            new_kp = create_solana_keypair(user_text)
+            wallet = make_wallet(new_kp)
+            # Save first: a wallet that is not on disk would vanish on restart
+            await persist(context.bot_data, db.save_wallet, user_id, bytes(new_kp), required=True)
+            user_wallets[user_id] = wallet
+            await update.message.reply_text(f"✅ Wallet connected!\nWallet: 🟢 {wallet['pubkey_str'][:7]}...")
         except Exception as e:
             await update.message.reply_text(f"Error connecting wallet: {e}")
         await start_command(update, context)
@@ -401,6 +545,7 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.user_data.get("awaiting_setpair"):
         context.user_data["awaiting_setpair"] = False
         user_pairs[user_id] = user_text
+        await persist(context.bot_data, db.save_pair, user_id, user_text)
         await update.message.reply_text(f"✅ Pair set to: `{user_text}`")
         await start_command(update, context)
         return
@@ -410,6 +555,7 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             threshold = float(user_text)
             price_alerts[user_id] = threshold
+            await persist(context.bot_data, db.save_alert, user_id, threshold)
             await update.message.reply_text(f"🚨 Alert set: I'll notify you when the price exceeds 💲{threshold} USD.")
         except ValueError:
             await update.message.reply_text("Invalid price. Try /alert again.")
@@ -419,66 +565,101 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data["awaiting_buy_custom"] = False
         try:
             amount = float(user_text)
-            current_price = get_dexscreener_info(CHAIN_ID, user_pairs.get(user_id, "")).get("price", 0.0) if user_id in user_pairs else 0.0
-            result_dict = execute_buy_transaction(amount, user_wallets[user_id])
-            if result_dict["status"] == "error":
-                await update.message.reply_text(f"❌ {result_dict['error']}")
-                return
-            pos = {
-                "amount": amount,
-                "purchase_price": current_price,
-                "signature": result_dict["signature"],
-                "timestamp": time.time(),
-                "pair": user_pairs.get(user_id, "")
-            }
-            positions.setdefault(user_id, []).append(pos)
-            await update.message.reply_text(
-                f"✅ Purchase executed:\nAmount: {amount} SOL\nSignature: `{result_dict['signature']}`\nWallet: `{user_wallets[user_id].pubkey()}`"
-            )
         except ValueError:
             await update.message.reply_text("Invalid amount. Try /buy again.")
+            return
+        await update.message.reply_text("⏳ Submitting transaction…")
+        context.application.create_task(
+            _finalize_buy(context, update.message, user_id, user_wallets[user_id], amount), update=update
+        )
         return
 
     if context.user_data.get("awaiting_sell_custom"):
         context.user_data["awaiting_sell_custom"] = False
         try:
             amount = float(user_text)
-            result_dict = execute_sell_transaction(amount, user_wallets[user_id])
-            if result_dict["status"] == "error":
-                await update.message.reply_text(f"❌ {result_dict['error']}")
-                return
-            await update.message.reply_text(
-                f"✅ Sale executed:\nAmount: {amount} tokens\nSignature: `{result_dict['signature']}`\nWallet: `{user_wallets[user_id].pubkey()}`"
-            )
         except ValueError:
             await update.message.reply_text("Invalid amount. Try /sell again.")
+            return
+        await update.message.reply_text("⏳ Submitting transaction…")
+        context.application.create_task(
+            _finalize_sell(update.message, user_wallets[user_id], amount), update=update
+        )
         return
 
 # ---------------------------- 10. PRICE ALERT JOB ----------------------------
+async def send_price_alert(context: ContextTypes.DEFAULT_TYPE, user_id: int, pair_id: str, price: float, threshold: float):
+    try:
+        await context.bot.send_message(
+            chat_id=user_id,
+            text=f"🚨 *ALERT!* The price for {pair_id} reached 💲{price:.6f} (threshold {threshold} USD).",
+            parse_mode="Markdown"
+        )
+    except Exception as e:
+        logging.error(f"[Error] Sending alert: {e}")
+        return
+    # Alerts are one-shot; keep it only if the user set a new threshold meanwhile
+    if price_alerts.get(user_id) == threshold:
+        del price_alerts[user_id]
+        await persist(context.bot_data, db.delete_alert, user_id)
+
 async def price_watcher(context: ContextTypes.DEFAULT_TYPE):
-    bot = context.bot
+    prune_price_cache()
+    # Phase 1: fetch every watched pair once, however many users watch it
+    pairs = list({user_pairs[user_id] for user_id in price_alerts if user_id in user_pairs})
+    infos = await asyncio.gather(
+        *[get_dexscreener_info(context.bot_data["http"], CHAIN_ID, pair_id) for pair_id in pairs],
+        return_exceptions=True
+    )
+    prices = {}
+    for pair_id, info in zip(pairs, infos):
+        if isinstance(info, Exception):
+            logging.error(f"[Error] price_watcher {pair_id}: {info}")
+        elif info.get("price"):
+            prices[pair_id] = info["price"]
+
+    # Phase 2: check every alert against the fetched prices
+    sends = []
     for user_id, threshold in list(price_alerts.items()):
-        if user_id not in user_pairs:
-            continue
-        pair_id = user_pairs[user_id]
-        info = get_dexscreener_info(CHAIN_ID, pair_id)
-        price = info.get("price")
+        pair_id = user_pairs.get(user_id)
+        price = prices.get(pair_id)
         if price and price >= threshold:
-            try:
-                await bot.send_message(
-                    chat_id=user_id,
-                    text=f"🚨 *ALERT!* The price for {pair_id} reached 💲{price:.6f} (threshold {threshold} USD).",
-                    parse_mode="Markdown"
-                )
-            except Exception as e:
-                logging.error(f"[Error] Sending alert: {e}")
+            sends.append(send_price_alert(context, user_id, pair_id, price, threshold))
+    await asyncio.gather(*sends)
 
 # ---------------------------- 11. RUN THE APPLICATION ----------------------------
+async def post_init(app):
+    # Shared HTTP session so DexScreener lookups reuse pooled connections
+    app.bot_data["http"] = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=50, limit_per_host=20, ttl_dns_cache=300)
+    )
+
+    # Restore the state saved by previous runs
+    conn = await asyncio.to_thread(db.connect, DB_PATH)
+    app.bot_data["db"] = conn
+    state = await asyncio.to_thread(db.load_state, conn)
+    for user_id, secret in state["user_wallets"].items():
+        user_wallets[user_id] = make_wallet(Keypair.from_bytes(secret))
+    user_pairs.update(state["user_pairs"])
+    price_alerts.update(state["price_alerts"])
+    for pos in state["positions"]:
+        user_id = pos.pop("user_id")
+        pos["time_str"] = format_position_time(pos["timestamp"])
+        positions.setdefault(user_id, {}).setdefault(pos["pair"], []).append(pos)
+    logging.info(f"[Bot] Loaded {len(user_wallets)} wallets and {len(state['positions'])} positions from {DB_PATH}")
+
+async def post_shutdown(app):
+    await app.bot_data["http"].close()
+    await solana_client.close()
+    app.bot_data["db"].close()
+
 def main():
     app = (
         ApplicationBuilder()
         .token(TELEGRAM_BOT_TOKEN)
         .rate_limiter(AIORateLimiter(overall_max_rate=20, overall_time_period=1.0))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
         .build()
     )
 
@@ -505,7 +686,16 @@ def main():
     app.job_queue.run_repeating(price_watcher, interval=60, first=0)
 
     logging.info("[Bot] Starting Telegram bot (python-telegram-bot v20+)...")
-    app.run_polling()
+    if WEBHOOK_URL:
+        # Telegram pushes updates to us instead of being long-polled
+        app.run_webhook(
+            listen="0.0.0.0",
+            port=WEBHOOK_PORT,
+            url_path=TELEGRAM_BOT_TOKEN,
+            webhook_url=f"{WEBHOOK_URL}/{TELEGRAM_BOT_TOKEN}",
+        )
+    else:
+        app.run_polling()
 
 if __name__ == "__main__":
     main()